@@ -1,9 +1,10 @@
 import os
 import json
+import threading
 import openai
 from dotenv import load_dotenv
-from typing import List, Dict, Any
-from .tools import GeoFileConverter
+from typing import Any, Dict, List, Optional
+from .tools import GeoFileConverter, ProgressCallback, emit
 
 class Agent:
     def __init__(self):
@@ -19,6 +20,8 @@ class Agent:
         self.model = "gpt-4"
         self.client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.converter = GeoFileConverter()
+        # Serialises access to the shared conversation history
+        self._messages_lock = threading.Lock()
         
         # Define available tools
         self.tools = [
@@ -93,11 +96,11 @@ class Agent:
             if file_paths:
                 message_content += f"\nAvailable files: {', '.join(file_paths.keys())}"
 
-            self.messages.append({"role": "user", "content": message_content})
+            messages = self._add_user_message(message_content)
             
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=self.messages,
+                messages=messages,
                 tools=self.tools
             )
 
@@ -109,7 +112,20 @@ class Agent:
         except Exception as e:
             return {"response": f"Error: {str(e)}"}
 
-    def plan_and_execute(self, prompt: str, file_paths: Dict[str, str] = None, approve_plan: bool = False) -> Dict[str, Any]:
+    def _add_user_message(self, content: str) -> List[Dict[str, Any]]:
+        """Append a user message to the shared history and return a snapshot for the API call."""
+        with self._messages_lock:
+            self.messages.append({"role": "user", "content": content})
+            return list(self.messages)
+
+    def plan_and_execute(self, prompt: str, file_paths: Dict[str, str] = None, approve_plan: bool = False,
+                         progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Ask the model for an execution plan, optionally running it straight away.
+
+        When a progress callback is given, the completion is streamed and each
+        plan token is passed on as a "token" event while it is generated.
+        """
         try:
             planning_prompt = f"""
             Task: {prompt}
@@ -133,15 +149,39 @@ class Agent:
             }}
             """
 
-            self.messages.append({"role": "user", "content": planning_prompt})
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.messages,
-                functions=self.tools  # Use the functions parameter
-            )
+            messages = self._add_user_message(planning_prompt)
+            if progress is None:
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    functions=self.tools  # Use the functions parameter
+                )
+                content = response.choices[0].message.content
+            else:
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    functions=self.tools,
+                    stream=True
+                )
+                chunks = []
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    token = chunk.choices[0].delta.content
+                    if token:
+                        chunks.append(token)
+                        emit(progress, "token", text=token)
+                content = "".join(chunks)
 
             # Parse the JSON response directly
-            plan_dict = json.loads(response.choices[0].message.content)
+            plan_dict = json.loads(content)
+
+            # Tool call arguments are passed around as JSON strings, as in the OpenAI tool_calls format
+            for call in plan_dict["function_calls"]:
+                arguments = call["function"].get("arguments", {})
+                if not isinstance(arguments, str):
+                    call["function"]["arguments"] = json.dumps(arguments)
             
             plan = {
                 "requires_approval": True,
@@ -152,7 +192,7 @@ class Agent:
             }
             
             if approve_plan:
-                return self.execute_tool_calls(plan_dict["function_calls"], file_paths)
+                return self.execute_tool_calls(plan_dict["function_calls"], file_paths, progress=progress)
             
             return plan
 
@@ -162,14 +202,23 @@ class Agent:
                 "explanation": f"Error creating plan: {str(e)}"
             }
 
-    def execute_tool_calls(self, tool_calls: List[Dict], file_paths: Dict[str, str] = None) -> Dict[str, Any]:
+    def execute_tool_calls(self, tool_calls: List[Dict], file_paths: Dict[str, str] = None,
+                           progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Run each planned tool call against the converter.
+
+        When a progress callback is given it receives "step" events around each
+        call, plus "progress" and "preview" events from a converter created for
+        this call only, so concurrent executions never share a callback.
+        """
         print(f"DEBUG: file_paths received: {file_paths}, {tool_calls}")
         if not tool_calls:
             return {"response": "No tool calls found."}
 
+        converter = GeoFileConverter(self.converter.target_crs, progress=progress) if progress else self.converter
         try:
             results = []
-            for tool_call in tool_calls:
+            for step, tool_call in enumerate(tool_calls, 1):
                 # Get the function details
                 function_details = tool_call["function"]
                 tool_name = function_details.get("name")
@@ -185,8 +234,12 @@ class Agent:
 
                 # Execute the function
                 try:
-                    method = getattr(self.converter, tool_name)
+                    emit(progress, "step", status="started", step=step,
+                         total=len(tool_calls), name=tool_name)
+                    method = getattr(converter, tool_name)
                     result = method(**arguments)
+                    emit(progress, "step", status="completed", step=step,
+                         total=len(tool_calls), name=tool_name)
 
                     if isinstance(result, dict):
                         results.append({
@@ -200,6 +253,8 @@ class Agent:
                         })
 
                 except Exception as e:
+                    emit(progress, "step", status="failed", step=step,
+                         total=len(tool_calls), name=tool_name, error=str(e))
                     return {"response": f"Error executing {tool_name}: {str(e)}"}
                 
             return results[-1] if results else {"response": "No results generated"}
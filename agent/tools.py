@@ -6,14 +6,42 @@ import os
 from shapely import wkt
 from pyproj import Transformer
 from shapely.geometry import shape
-from typing import Dict, Optional, Union, List
+from typing import Any, Callable, Dict, Optional, Union, List
+
+PREVIEW_ROWS = 5
+
+ProgressCallback = Callable[[Dict[str, Any]], None]
+
+def emit(progress: Optional[ProgressCallback], event: str, **data) -> None:
+    """Send an event to a progress callback, if one is given. Callback errors are logged, not raised."""
+    if progress is None:
+        return
+    try:
+        progress({"event": event, **data})
+    except Exception as e:
+        print(f"Error emitting {event} event: {str(e)}")
 
 class GeoFileConverter:
     """Utility class for converting various geospatial file formats to CSV."""
     
-    def __init__(self, target_crs: str = 'EPSG:4326'):
-        """Initialize with target CRS (defaults to WGS84)."""
+    def __init__(self, target_crs: str = 'EPSG:4326', progress: Optional[ProgressCallback] = None):
+        """
+        Initialize with target CRS (defaults to WGS84).
+
+        Args:
+            target_crs: CRS for converted output
+            progress: Optional callback receiving progress and preview events
+        """
         self.target_crs = target_crs
+        self.progress = progress
+
+    def _emit_preview(self, df: pd.DataFrame, filename: str) -> None:
+        """Send the first rows of an output table as soon as they are available."""
+        if self.progress is None:
+            return
+        emit(self.progress, "preview", filename=filename,
+             rows=df.head(PREVIEW_ROWS).to_csv(index=False, quoting=1),
+             total_rows=len(df))
         
     def list_gdb_layers(self, gdb_path: str) -> List[str]:
         """List all layers in a geodatabase file."""
@@ -35,15 +63,17 @@ class GeoFileConverter:
         layers = fiona.listlayers(gdb_path)
         print(f"Found {len(layers)} layers in GDB file")
         
-        for layer in layers:
+        for i, layer in enumerate(layers, 1):
             try:
                 print(f"\nProcessing layer: {layer}")
+                emit(self.progress, "progress", stage="layer", layer=layer, current=i, total=len(layers))
                 gdf = gpd.read_file(gdb_path, layer=layer)
                 
                 if 'geometry' not in gdf.columns:
                     print(f"Layer {layer} has no geometry - saving as regular CSV")
                     output_file = os.path.join(output_folder, f"{layer}.csv")
                     gdf.to_csv(output_file, index=False)
+                    self._emit_preview(gdf, f"{layer}.csv")
                     continue
                 
                 if gdf.crs and gdf.crs != self.target_crs:
@@ -55,9 +85,11 @@ class GeoFileConverter:
                 
                 output_file = os.path.join(output_folder, f"{layer}.csv")
                 gdf.to_csv(output_file, index=False)
+                self._emit_preview(gdf, f"{layer}.csv")
                 
             except Exception as e:
                 print(f"Error processing layer {layer}: {str(e)}")
+                emit(self.progress, "progress", stage="layer_error", layer=layer, error=str(e))
                 continue
 
     def convert_shapefile_to_csv(self, shp_path: str, output_folder: str) -> None:
@@ -72,15 +104,18 @@ class GeoFileConverter:
         
         try:
             print(f"\nProcessing shapefile: {shp_path}")
+            emit(self.progress, "progress", stage="read", file=os.path.basename(shp_path))
             gdf = gpd.read_file(shp_path)
             
             if 'geometry' not in gdf.columns:
                 print(f"Shapefile has no geometry - saving as regular CSV")
                 output_file = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(shp_path))[0]}.csv")
                 gdf.to_csv(output_file, index=False)
+                self._emit_preview(gdf, os.path.basename(output_file))
                 return
             
             if gdf.crs and gdf.crs != self.target_crs:
+                emit(self.progress, "progress", stage="reproject", crs=self.target_crs)
                 gdf = gdf.to_crs(self.target_crs)
             
             gdf['geometry'] = gdf['geometry'].apply(
@@ -89,6 +124,7 @@ class GeoFileConverter:
             
             output_file = os.path.join(output_folder, f"{os.path.splitext(os.path.basename(shp_path))[0]}.csv")
             gdf.to_csv(output_file, index=False)
+            self._emit_preview(gdf, os.path.basename(output_file))
             
         except Exception as e:
             print(f"Error processing shapefile: {str(e)}")
@@ -104,23 +140,28 @@ class GeoFileConverter:
             init_crs: Initial CRS EPSG code
             simplify_tolerance: Tolerance for geometry simplification (0 to disable)
         """
+        emit(self.progress, "progress", stage="read", file=os.path.basename(file_path))
         gdf = gpd.read_file(file_path)
         gdf = gdf.set_geometry('geometry')
         gdf = gdf[gdf.is_valid]
+        emit(self.progress, "progress", stage="reproject", crs='EPSG:4326')
         gdf = gdf.set_crs(epsg=init_crs, allow_override=True).to_crs(epsg='4326')
         gdf = gdf.reset_index(drop=True)
         
         if simplify_tolerance:
+            emit(self.progress, "progress", stage="simplify", tolerance=simplify_tolerance)
             gdf['geometry'] = gdf['geometry'].simplify(tolerance=simplify_tolerance)
         
         gdf['geometry'] = gdf.geometry.apply(lambda geom: json.dumps(geom.__geo_interface__))
         gdf['DataSource'] = 'GIS'
+        self._emit_preview(gdf, output_name)
         csv_data = gdf.to_csv(index=False, quoting=1)
         return {"response": csv_data, "filename": output_name}
 
     def process_points(self, file_path: str, output_name: str, init_crs: str) -> Dict:
         try:
             print(f"DEBUG: Starting process_points with file: {file_path}")
+            emit(self.progress, "progress", stage="read", file=os.path.basename(file_path))
             
             if file_path.endswith('.geojson'):
                 print(f"DEBUG: Reading GeoJSON file")
@@ -136,15 +177,18 @@ class GeoFileConverter:
                 gdf = gpd.GeoDataFrame(df, geometry='geometry')
             
             print(f"DEBUG: Initial CRS setting to {init_crs}")
+            emit(self.progress, "progress", stage="reproject", crs='EPSG:4326')
             gdf = gdf[gdf.is_valid]
             gdf = gdf.set_crs(epsg=init_crs, allow_override=True).to_crs(epsg='4326')
             gdf = gdf.reset_index(drop=True)
             
             print("DEBUG: Calculating centroids")
+            emit(self.progress, "progress", stage="centroids")
             gdf['Longitude'] = gdf.geometry.apply(lambda geom: geom.centroid.x if geom else None)
             gdf['Latitude'] = gdf.geometry.apply(lambda geom: geom.centroid.y if geom else None)
             gdf['DataSource'] = 'GIS'
             gdf = gdf.drop(columns=['geometry'])
+            self._emit_preview(gdf, output_name)
             
             print("DEBUG: Converting to CSV")
             csv_data = gdf.to_csv(index=False, quoting=1)
@@ -2,12 +2,15 @@ import os
 import requests
 import json
 import time
-import threading
-from typing import Dict
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 class GISAssistant:
     def __init__(self):
-        self.api_url = "http://localhost:8000/api/v1"
+        self.server_url = "http://localhost:8000"
+        self.api_url = f"{self.server_url}/api/v1"
+        self.max_reconnects = 5
+        # (connect, read) timeouts; the server sends keepalives well within the read timeout
+        self.stream_timeout = (10, 60)
         self.loaded_files = {}
         self.supported_formats = {
             '.csv': 'text/csv',
@@ -15,16 +18,137 @@ class GISAssistant:
             '.shp': 'application/x-shapefile',
             '.gdb': 'application/x-geodatabase'
         }
-        self._stop_loading = False
+        self._in_token_stream = False
 
-    def _loading_animation(self, start_time: float) -> None:
-        animation = "|/-\\"
-        idx = 0
-        while not self._stop_loading:
-            elapsed = int(time.time() - start_time)
-            print(f"\rProcessing {animation[idx]} ({elapsed}s)", end="", flush=True)
-            idx = (idx + 1) % len(animation)
-            time.sleep(0.1)
+    def _iter_sse(self, response: requests.Response) -> Iterator[Tuple[Optional[str], str, Dict[str, Any]]]:
+        """Parse a Server-Sent Events response into (id, event, data) tuples."""
+        event_id, event, data = None, "message", []
+        for line in response.iter_lines(decode_unicode=True):
+            if line is None:
+                continue
+            if line == "":
+                if data:
+                    yield event_id, event, json.loads("\n".join(data))
+                event_id, event, data = None, "message", []
+            elif line.startswith(":"):
+                continue  # keepalive comment
+            else:
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "id":
+                    event_id = value
+                elif field == "event":
+                    event = value
+                elif field == "data":
+                    data.append(value)
+
+    def _render_event(self, event: str, data: Dict[str, Any]) -> None:
+        """Print a streamed event as it arrives."""
+        if event == "token":
+            if not self._in_token_stream:
+                print("\n(agent): ", end="")
+                self._in_token_stream = True
+            print(data["text"], end="", flush=True)
+            return
+
+        if self._in_token_stream:
+            print()
+            self._in_token_stream = False
+
+        if event == "status":
+            if data["state"] == "queued":
+                print(f"Waiting for a free worker (position {data['position']} in queue)...")
+        elif event == "step":
+            line = f"[step {data['step']}/{data['total']}] {data['name']} {data['status']}"
+            if data.get("error"):
+                line += f": {data['error']}"
+            print(line)
+        elif event == "progress":
+            stage = data.get("stage")
+            if stage == "layer":
+                print(f" layer {data['current']}/{data['total']}: {data['layer']}")
+            elif stage == "layer_error":
+                print(f" layer {data['layer']} failed: {data['error']}")
+            else:
+                details = ", ".join(f"{k}={v}" for k, v in data.items() if k != "stage")
+                print(f" {stage}" + (f" ({details})" if details else ""))
+        elif event == "preview":
+            print(f"\nPreview of {data['filename']} ({data['total_rows']} rows):")
+            print(data["rows"])
+
+    def _stream_job(self, data: Dict[str, str], files: list) -> Optional[Dict[str, Any]]:
+        """
+        Submit a request to the streaming endpoint and render events until the job is done.
+
+        If the connection drops, reconnects to the job and resumes after the
+        last event received. Returns the final plan, result or error event.
+        """
+        response = requests.post(
+            f"{self.api_url}/process/stream",
+            data=data,
+            files=files,
+            stream=True,
+            timeout=self.stream_timeout
+        )
+        response.raise_for_status()
+
+        job_id = response.headers.get("X-Job-ID")
+        last_event_id = None
+        outcome = None
+        attempts = 0
+
+        while True:
+            try:
+                if response is not None:
+                    for event_id, event, payload in self._iter_sse(response):
+                        attempts = 0
+                        if event_id is not None:
+                            last_event_id = event_id
+                        if event == "done":
+                            return outcome
+                        if event in ("plan", "result", "error"):
+                            outcome = {"event": event, **payload}
+                        self._render_event(event, payload)
+            except requests.RequestException:
+                pass
+            finally:
+                if response is not None:
+                    response.close()
+
+            # The stream ended before the job was done
+            attempts += 1
+            if job_id is None or attempts > self.max_reconnects:
+                raise ConnectionError("Lost connection to the server")
+
+            self._in_token_stream = False
+            print(f"\nConnection lost, reconnecting ({attempts}/{self.max_reconnects})...")
+            time.sleep(min(2 ** attempts, 10))
+
+            headers = {"Last-Event-ID": last_event_id} if last_event_id is not None else {}
+            try:
+                response = requests.get(
+                    f"{self.api_url}/jobs/{job_id}/stream",
+                    headers=headers,
+                    stream=True,
+                    timeout=self.stream_timeout
+                )
+                response.raise_for_status()
+            except requests.HTTPError as e:
+                if e.response is not None and e.response.status_code == 404:
+                    raise ConnectionError(f"Job {job_id} is no longer available")
+                response = None
+            except requests.RequestException:
+                response = None
+
+    def _print_result(self, result: Dict[str, Any]) -> None:
+        if result.get("filename"):
+            print(f"\nOutput file: {result['filename']}")
+        if result.get("file"):
+            print("\nOutput preview:")
+            truncated = result.get("truncated") or len(result["file"]) > 500
+            print(result["file"][:500] + "..." if truncated else result["file"])
+        if result.get("result_url"):
+            print(f"\nFull output: {self.server_url}{result['result_url']}")
 
     def load_file(self, file_path: str) -> None:
         try:
@@ -78,112 +202,84 @@ class GISAssistant:
             print(f"Error fetching functions: {str(e)}")
 
     def process_prompt(self, prompt: str) -> None:
+        files = []
         try:
-            start_time = time.time()
-            
-            # Start loading animation
-            self._stop_loading = False
-            loading_thread = threading.Thread(target=self._loading_animation, args=(start_time,))
-            loading_thread.daemon = True
-            loading_thread.start()
-
             # Prepare files for upload
-            files = []
             for name, info in self.loaded_files.items():
                 files.append(
                     ("files", (name, open(info["path"], "rb"), info["type"]))
                 )
 
             # Send initial request
-            response = requests.post(
-                f"{self.api_url}/process",
-                data={"prompt": prompt, "approve_plan": "false"},
-                files=files
-            )
+            result = self._stream_job({"prompt": prompt, "approve_plan": "false"}, files)
 
-            # Stop loading animation
-            self._stop_loading = True
-            loading_thread.join()
-            print("\r" + " " * 50 + "\r", end="", flush=True)
+            if result is None:
+                print("\nNo response received")
+                return
 
-            result = response.json()
+            if result["event"] == "error":
+                print(f"\nError: {result['detail']}")
+                return
 
-            if isinstance(result, dict) and "response" in result and not result.get("requires_approval"):
+            if result["event"] == "result":
                 print("\n(agent): ")
                 print(result["response"])
-                if "filename" in result:
-                    print(f"\nOutput file: {result['filename']}")
-                if "file" in result:
-                    print("\nOutput preview:")
-                    print(result["file"][:500] + "..." if len(result["file"]) > 500 else result["file"])
+                self._print_result(result)
                 return
 
             # Handle plan approval if needed
-            if result.get("requires_approval"):
-                print("\nProposed plan:")
-                
-                explanation = result.get("explanation")
-                if explanation:
-                    print(explanation)
-
-                if "plan" in result and "function_calls" in result["plan"]:
-                    for i, call in enumerate(result["plan"]["function_calls"], 1):
-                        func = call["function"]
-                        print(f"\nStep {i}:")
-                        print(f" Function: {func['name']}")
-                        print(" Arguments:")
-                        for arg, value in json.loads(func['arguments']).items():
-                            print(f" - {arg}: {value}")
-
-                if input("\nApprove plan? (y/n): ").strip().lower() == 'y':
-                    print("\nExecuting plan...")
-                    
-                    # Start loading animation for execution
-                    self._stop_loading = False
-                    loading_thread = threading.Thread(target=self._loading_animation, args=(time.time(),))
-                    loading_thread.daemon = True
-                    loading_thread.start()
-
-                    # Execute approved plan
-                    files = [
-                        ("files", (name, open(info["path"], "rb"), info["type"]))
-                        for name, info in self.loaded_files.items()
-                    ]
-                    
-                    response = requests.post(
-                        f"{self.api_url}/process",
-                        data={
-                            "prompt": prompt,
-                            "approve_plan": "true",
-                            "plan": json.dumps(result["plan"])
-                        },
-                        files=files
-                    )
-
-                    result = response.json()
-
-                    # Stop loading animation
-                    self._stop_loading = True
-                    loading_thread.join()
-                    print("\r" + " " * 50 + "\r", end="", flush=True)
-
-                    # Handle execution result
-                    if isinstance(result, dict):
-                        if "detail" in result:  # Error case
-                            print(f"\nError: {result['detail']}")
-                        elif "response" in result:
-                            print(f"\nExecution complete: {result['response']}")
-                            if "filename" in result:
-                                print(f"Output file: {result['filename']}")
-                            if "file" in result:
-                                print("\nOutput preview:")
-                                print(result["file"][:500] + "..." if len(result["file"]) > 500 else result["file"])
+            if not result.get("requires_approval"):
+                print(f"\n{result.get('explanation', '')}")
+                return
+
+            print("\nProposed plan:")
+
+            explanation = result.get("explanation")
+            if explanation:
+                print(explanation)
+
+            for i, call in enumerate(result["plan"]["function_calls"], 1):
+                func = call["function"]
+                print(f"\nStep {i}:")
+                print(f" Function: {func['name']}")
+                print(" Arguments:")
+                for arg, value in json.loads(func['arguments']).items():
+                    print(f" - {arg}: {value}")
+
+            if input("\nApprove plan? (y/n): ").strip().lower() == 'y':
+                print("\nExecuting plan...")
+
+                # Execute approved plan
+                for file in files:
+                    file[1][1].close()
+                files = [
+                    ("files", (name, open(info["path"], "rb"), info["type"]))
+                    for name, info in self.loaded_files.items()
+                ]
+
+                result = self._stream_job(
+                    {
+                        "prompt": prompt,
+                        "approve_plan": "true",
+                        "plan": json.dumps(result["plan"])
+                    },
+                    files
+                )
+
+                # Handle execution result
+                if result is None:
+                    print("\nNo response received")
+                elif result["event"] == "error":
+                    print(f"\nError: {result['detail']}")
+                else:
+                    print(f"\nExecution complete: {result['response']}")
+                    self._print_result(result)
 
         except Exception as e:
-            self._stop_loading = True
-            print("\r" + " " * 50 + "\r", end="", flush=True)
-            print(f"Error: {str(e)}")
-            
+            self._in_token_stream = False
+            print(f"\nError: {str(e)}")
+
+        finally:
             # Close any open file handles
             for file in files:
                 try:
@@ -1,11 +1,28 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse
-from typing import List, Dict, Optional
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Deque, List, Dict, Optional, Set, Tuple
+from collections import deque
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
+import time
+import uuid
+import shutil
+import asyncio
+import threading
 from agent.agent import Agent
+from agent.tools import ProgressCallback
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    cleanup = asyncio.create_task(_cleanup_jobs_periodically())
+    yield
+    cleanup.cancel()
+    job_executor.shutdown(wait=False)
+
+app = FastAPI(lifespan=lifespan)
 agent = Agent()
 
 # Setup directories
@@ -16,6 +33,222 @@ OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+PROCESSING_KEYWORDS = ["process", "convert", "transform"]
+
+# Streaming settings
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments on an idle stream
+JOB_TTL = 600  # seconds a finished job stays available for reconnects
+JOB_CLEANUP_INTERVAL = 60  # seconds between sweeps for expired jobs
+MAX_CONCURRENT_JOBS = 4  # worker threads running streamed jobs
+MAX_QUEUED_JOBS = 16  # jobs waiting for a worker before new ones are rejected
+MAX_JOB_BUFFER_BYTES = 1024 * 1024  # oldest events are dropped beyond this
+RESULT_FILE_CHARS = 500  # result CSV characters sent in the stream
+
+
+class Job:
+    """Buffered event log for a streamed request, so clients can reconnect and resume."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.finished_at: Optional[float] = None
+        self.result_path: Optional[str] = None  # full output, written under OUTPUT_DIR
+        self._events: Deque[Tuple[int, str]] = deque()  # (event id, SSE message)
+        self._next_id = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Append an event and wake any connected streams. Safe to call from worker threads."""
+        data = dict(event)
+        name = data.pop("event")
+        with self._lock:
+            message = f"id: {self._next_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+            self._events.append((self._next_id, message))
+            self._next_id += 1
+            self._size += len(message)
+            # Keep at least the newest event so the final outcome is never dropped
+            while self._size > MAX_JOB_BUFFER_BYTES and len(self._events) > 1:
+                self._size -= len(self._events.popleft()[1])
+            if name == "done":
+                self.finished_at = time.time()
+            waiters = list(self._waiters)
+
+        for loop, wake in waiters:
+            loop.call_soon_threadsafe(wake.set)
+
+    def _pending(self, next_id: int) -> Tuple[List[Tuple[int, str]], bool]:
+        with self._lock:
+            pending = [event for event in self._events if event[0] >= next_id]
+            return pending, self.finished_at is not None
+
+    async def stream(self, start: int = 0) -> AsyncIterator[str]:
+        """
+        Yield SSE messages from event id `start` until the job is done.
+
+        Waits on an asyncio event rather than a thread, so idle streams do not
+        hold a threadpool worker. Events already dropped from the buffer are skipped.
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            next_id = start
+            while True:
+                waiter[1].clear()
+                pending, finished = self._pending(next_id)
+                if pending:
+                    for event_id, message in pending:
+                        yield message
+                    next_id = pending[-1][0] + 1
+                    continue
+                if finished:
+                    return
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+jobs: Dict[str, Job] = {}
+jobs_lock = threading.Lock()
+active_jobs = 0  # submitted jobs that have not finished, guarded by jobs_lock
+job_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_JOBS, thread_name_prefix="job")
+
+
+def _job_output_dir(job_id: str) -> str:
+    return os.path.join(OUTPUT_DIR, "jobs", job_id)
+
+
+def _purge_jobs() -> None:
+    now = time.time()
+    with jobs_lock:
+        expired = [k for k, v in jobs.items() if v.finished_at and now - v.finished_at > JOB_TTL]
+        for job_id in expired:
+            del jobs[job_id]
+    for job_id in expired:
+        shutil.rmtree(_job_output_dir(job_id), ignore_errors=True)
+
+
+def _get_job(job_id: str) -> Job:
+    _purge_jobs()
+    with jobs_lock:
+        job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+def _submit_job(prompt: str, file_paths: Dict[str, str], approve_plan: bool, plan: Optional[str]) -> Job:
+    """Queue a job on the executor, or raise 503 when too many are already waiting."""
+    global active_jobs
+    _purge_jobs()
+    job = Job()
+    with jobs_lock:
+        if active_jobs >= MAX_CONCURRENT_JOBS + MAX_QUEUED_JOBS:
+            raise HTTPException(status_code=503, detail="Too many jobs in progress, try again later")
+        ahead = active_jobs - MAX_CONCURRENT_JOBS
+        active_jobs += 1
+        jobs[job.id] = job
+
+    job.publish({"event": "job", "job_id": job.id})
+    if ahead >= 0:
+        job.publish({"event": "status", "state": "queued", "position": ahead + 1})
+    job_executor.submit(_run_job, job, prompt, file_paths, approve_plan, plan)
+    return job
+
+
+async def _cleanup_jobs_periodically() -> None:
+    while True:
+        await asyncio.sleep(JOB_CLEANUP_INTERVAL)
+        _purge_jobs()
+
+
+def _stream_response(job: Job, start: int = 0) -> StreamingResponse:
+    return StreamingResponse(
+        job.stream(start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Job-ID": job.id}
+    )
+
+
+async def _save_uploads(files: Optional[List[UploadFile]]) -> Dict[str, str]:
+    file_paths = {}
+    if files:
+        for file in files:
+            file_path = os.path.join(UPLOAD_DIR, file.filename)
+            content = await file.read()
+            with open(file_path, "wb") as f:
+                f.write(content)
+            file_paths[file.filename] = file_path
+    return file_paths
+
+
+def _handle_request(prompt: str, file_paths: Dict[str, str], approve_plan: bool, plan: Optional[str],
+                    progress: Optional[ProgressCallback] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Route a request to plan execution, planning or a plain question.
+
+    Returns the kind of outcome ("result" or "plan") and its payload, shared by
+    the JSON and streaming endpoints.
+    """
+    if approve_plan and plan:
+        plan_dict = json.loads(plan)
+        result = agent.execute_tool_calls(plan_dict["function_calls"], file_paths, progress=progress)
+        return "result", {
+            "response": result.get("response", ""),
+            "filename": result.get("filename"),
+            "file": result.get("file")
+        }
+
+    # Check if this is a processing request
+    if any(keyword in prompt.lower() for keyword in PROCESSING_KEYWORDS):
+        result = agent.plan_and_execute(prompt, file_paths, progress=progress)
+        return "plan", {
+            "requires_approval": result.get("requires_approval", False),
+            "explanation": result.get("explanation", ""),
+            "plan": {
+                "function_calls": result.get("plan", {}).get("function_calls", [])
+            }
+        }
+
+    # Handle as a regular question
+    response = agent.ask(prompt, file_paths)
+    return "result", {"response": response.get("response", "")}
+
+
+def _run_job(job: Job, prompt: str, file_paths: Dict[str, str], approve_plan: bool, plan: Optional[str]) -> None:
+    global active_jobs
+    try:
+        job.publish({"event": "status", "state": "started"})
+        kind, payload = _handle_request(prompt, file_paths, approve_plan, plan, progress=job.publish)
+
+        # Only the start of the output is streamed; the full file is fetched from /jobs/{job_id}/result
+        file = payload.get("file")
+        if file:
+            output_dir = _job_output_dir(job.id)
+            os.makedirs(output_dir, exist_ok=True)
+            result_path = os.path.join(output_dir, os.path.basename(payload.get("filename") or "result.csv"))
+            with open(result_path, "w") as f:
+                f.write(file)
+            job.result_path = result_path
+            payload.update({
+                "file": file[:RESULT_FILE_CHARS],
+                "truncated": len(file) > RESULT_FILE_CHARS,
+                "result_url": f"/api/v1/jobs/{job.id}/result"
+            })
+        job.publish({"event": kind, **payload})
+    except Exception as e:
+        job.publish({"event": "error", "detail": str(e)})
+    finally:
+        with jobs_lock:
+            active_jobs -= 1
+        job.publish({"event": "done", "job_id": job.id})
+
+
 @app.post("/api/v1/process")
 async def process_data(
     prompt: str = Form(...),
@@ -25,43 +258,53 @@ async def process_data(
 ):
     try:
         # Save uploaded files
-        file_paths = {}
-        if files:
-            for file in files:
-                file_path = os.path.join(UPLOAD_DIR, file.filename)
-                content = await file.read()
-                with open(file_path, "wb") as f:
-                    f.write(content)
-                file_paths[file.filename] = file_path
-
-        # Handle request based on type
-        if approve_plan and plan:
-            plan_dict = json.loads(plan)
-            result = agent.execute_tool_calls(plan_dict["function_calls"], file_paths)  # Changed from tool_calls to function_calls
-            return {
-                "response": "Plan executed successfully",
-                "filename": result.get("filename"),
-                "file": result.get("file")
-            }
+        file_paths = await _save_uploads(files)
 
-        # Check if this is a processing request
-        if any(keyword in prompt.lower() for keyword in ["process", "convert", "transform"]):
-            plan = agent.plan_and_execute(prompt, file_paths)
-            return {
-                "requires_approval": True,  # Always require approval for processing
-                "explanation": plan.get("explanation", ""),
-                "plan": {
-                    "function_calls": plan.get("tool_calls", [])  # Changed structure to match client expectation
-                }
-            }
+        # Run the blocking agent call off the event loop so open streams keep flowing
+        kind, payload = await run_in_threadpool(_handle_request, prompt, file_paths, approve_plan, plan)
+        return payload
 
-        # Handle as a regular question
-        response = agent.ask(prompt, file_paths)
-        return {"response": response.get('response', '')}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/v1/process/stream")
+async def process_data_stream(
+    prompt: str = Form(...),
+    files: List[UploadFile] = File(None),
+    approve_plan: bool = Form(False),
+    plan: Optional[str] = Form(None)
+):
+    """
+    Same as /process, but returns a Server-Sent Events stream of plan tokens,
+    step progress and output previews. The job keeps running if the client
+    disconnects; it can resume from /jobs/{job_id}/stream.
+    """
+    try:
+        file_paths = await _save_uploads(files)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    job = _submit_job(prompt, file_paths, approve_plan, plan)
+    return _stream_response(job)
+
+@app.get("/api/v1/jobs/{job_id}/stream")
+async def resume_job_stream(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Replay a job's events after Last-Event-ID, then keep streaming until it is done."""
+    job = _get_job(job_id)
+    try:
+        start = int(last_event_id) + 1 if last_event_id is not None else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid Last-Event-ID: {last_event_id}")
+    return _stream_response(job, start)
+
+@app.get("/api/v1/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """Download the full output file of a finished job."""
+    job = _get_job(job_id)
+    if job.result_path is None or not os.path.exists(job.result_path):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} has no result file")
+    return FileResponse(job.result_path, media_type="text/csv", filename=os.path.basename(job.result_path))
+
 @app.get("/api/v1/available_functions")
 async def get_available_functions():
     return {"functions": [tool["function"]["name"] for tool in agent.tools]}
@@ -0,0 +1,47 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("geopandas")
+pytest.importorskip("openai")
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from agent.agent import Agent
+
+
+def stream_chunks(text: str, size: int = 7):
+    for i in range(0, len(text), size):
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + size]))])
+    # Final chunk carries no content, as in the OpenAI stream
+    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))])
+
+
+def test_plan_and_execute_streams_plan_tokens():
+    plan_json = json.dumps({
+        "explanation": "Convert points",
+        "function_calls": [{"function": {"name": "process_points",
+                                         "arguments": {"file_path": "a.csv", "output_name": "b.csv", "init_crs": "4326"}}}]
+    })
+    agent = Agent()
+    lock_held = []
+
+    def create(**kwargs):
+        assert kwargs["stream"] is True
+        lock_held.append(agent._messages_lock.locked())
+        return stream_chunks(plan_json)
+
+    agent.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    events = []
+    plan = agent.plan_and_execute("convert a.csv", {"a.csv": "/tmp/a.csv"}, progress=events.append)
+
+    tokens = [event["text"] for event in events if event["event"] == "token"]
+    assert len(tokens) > 1
+    assert "".join(tokens) == plan_json
+    assert lock_held == [False]
+
+    assert plan["requires_approval"] is True
+    arguments = plan["plan"]["function_calls"][0]["function"]["arguments"]
+    assert json.loads(arguments) == {"file_path": "a.csv", "output_name": "b.csv", "init_crs": "4326"}
\ No newline at end of file
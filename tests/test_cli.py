@@ -0,0 +1,72 @@
+import pytest
+
+requests = pytest.importorskip("requests")
+
+from cli import main
+from cli.main import GISAssistant
+
+
+class FakeResponse:
+    def __init__(self, lines, error=None, headers=None):
+        self.lines = lines
+        self.error = error
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self.lines
+        if self.error:
+            raise self.error
+
+    def close(self):
+        self.closed = True
+
+
+def sse(event_id, event, data):
+    return [f"id: {event_id}", f"event: {event}", f"data: {data}", ""]
+
+
+def test_iter_sse_parses_events_and_skips_keepalives():
+    lines = [": keepalive", ""] + sse(0, "token", '{"text": "Hi"}') + [": keepalive", ""] + sse(1, "done", "{}")
+    events = list(GISAssistant()._iter_sse(FakeResponse(lines)))
+    assert events == [("0", "token", {"text": "Hi"}), ("1", "done", {})]
+
+
+def test_stream_job_reconnects_with_last_event_id(monkeypatch, capsys):
+    first = FakeResponse(
+        sse(0, "job", '{"job_id": "abc"}') + sse(1, "token", '{"text": "pl"}'),
+        error=requests.exceptions.ChunkedEncodingError("connection dropped"),
+        headers={"X-Job-ID": "abc"}
+    )
+    resumed = FakeResponse(sse(2, "result", '{"response": "ok"}') + sse(3, "done", "{}"))
+    get_calls = []
+
+    def fake_get(url, headers=None, **kwargs):
+        get_calls.append((url, headers))
+        return resumed
+
+    monkeypatch.setattr(main.requests, "post", lambda *args, **kwargs: first)
+    monkeypatch.setattr(main.requests, "get", fake_get)
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+    result = GISAssistant()._stream_job({"prompt": "hi"}, [])
+
+    assert result == {"event": "result", "response": "ok"}
+    assert get_calls == [("http://localhost:8000/api/v1/jobs/abc/stream", {"Last-Event-ID": "1"})]
+    assert first.closed and resumed.closed
+    assert "reconnecting (1/5)" in capsys.readouterr().out
+
+
+def test_stream_job_gives_up_after_max_reconnects(monkeypatch):
+    def dropped(*args, **kwargs):
+        return FakeResponse([], error=requests.exceptions.ChunkedEncodingError("dropped"), headers={"X-Job-ID": "abc"})
+
+    monkeypatch.setattr(main.requests, "post", dropped)
+    monkeypatch.setattr(main.requests, "get", dropped)
+    monkeypatch.setattr(main.time, "sleep", lambda seconds: None)
+
+    with pytest.raises(ConnectionError):
+        GISAssistant()._stream_job({"prompt": "hi"}, [])
\ No newline at end of file
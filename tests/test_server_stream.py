@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("geopandas")
+pytest.importorskip("openai")
+
+import pandas as pd
+
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from fastapi.testclient import TestClient
+
+from agent.tools import GeoFileConverter, emit
+from server import server
+
+
+@pytest.fixture(autouse=True)
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "OUTPUT_DIR", str(tmp_path))
+
+
+def parse_sse(body: str):
+    events = []
+    for message in body.split("\n\n"):
+        fields = {}
+        for line in message.split("\n"):
+            if not line or line.startswith(":"):
+                continue
+            field, _, value = line.partition(": ")
+            fields[field] = value
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_concurrent_jobs_only_receive_their_own_events(monkeypatch):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_process_points(self, file_path, output_name, init_crs):
+        # Interleave both jobs step by step so a shared callback would mix their events
+        for i in range(3):
+            emit(self.progress, "progress", stage="fake", file=output_name, index=i)
+            barrier.wait()
+        self._emit_preview(pd.DataFrame({"name": [output_name]}), output_name)
+        return {"response": f"rows for {output_name}", "filename": output_name}
+
+    monkeypatch.setattr(GeoFileConverter, "process_points", fake_process_points)
+    client = TestClient(server.app)
+    bodies = {}
+
+    def run(name):
+        plan = {"function_calls": [{"function": {
+            "name": "process_points",
+            "arguments": json.dumps({"file_path": name, "output_name": name, "init_crs": "4326"})
+        }}]}
+        with client.stream("POST", "/api/v1/process/stream",
+                           data={"prompt": "convert", "approve_plan": "true", "plan": json.dumps(plan)}) as response:
+            bodies[name] = response.read().decode()
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in ("a.csv", "b.csv")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    for name in ("a.csv", "b.csv"):
+        events = parse_sse(bodies[name])
+        progress = [data for event, data in events if event == "progress"]
+        assert [data["index"] for data in progress] == [0, 1, 2]
+        assert all(data["file"] == name for data in progress)
+        previews = [data for event, data in events if event == "preview"]
+        assert [data["filename"] for data in previews] == [name]
+        assert name in previews[0]["rows"]
+        steps = [data["status"] for event, data in events if event == "step"]
+        assert steps == ["started", "completed"]
+        result = [data for event, data in events if event == "result"]
+        assert result[0]["filename"] == name
+        assert events[-1][0] == "done"
+
+def event_ids(body: str):
+    return [int(line[4:]) for line in body.split("\n") if line.startswith("id: ")]
+
+
+def approve_form(name: str):
+    plan = {"function_calls": [{"function": {
+        "name": "process_points",
+        "arguments": json.dumps({"file_path": name, "output_name": name, "init_crs": "4326"})
+    }}]}
+    return {"prompt": "convert", "approve_plan": "true", "plan": json.dumps(plan)}
+
+
+def add_finished_job(count: int = 4) -> server.Job:
+    job = server.Job()
+    for i in range(count - 1):
+        job.publish({"event": "token", "text": f"t{i}"})
+    job.publish({"event": "done", "job_id": job.id})
+    with server.jobs_lock:
+        server.jobs[job.id] = job
+    return job
+
+
+def test_resume_replays_events_after_last_event_id():
+    job = add_finished_job()
+    client = TestClient(server.app)
+
+    response = client.get(f"/api/v1/jobs/{job.id}/stream", headers={"Last-Event-ID": "1"})
+    assert response.status_code == 200
+    assert event_ids(response.text) == [2, 3]
+    assert [event for event, data in parse_sse(response.text)] == ["token", "done"]
+
+    response = client.get(f"/api/v1/jobs/{job.id}/stream")
+    assert event_ids(response.text) == [0, 1, 2, 3]
+
+
+def test_resume_rejects_non_integer_last_event_id():
+    job = add_finished_job()
+    response = TestClient(server.app).get(f"/api/v1/jobs/{job.id}/stream", headers={"Last-Event-ID": "abc"})
+    assert response.status_code == 400
+
+
+def test_resume_unknown_or_purged_job_is_404():
+    client = TestClient(server.app)
+    assert client.get("/api/v1/jobs/missing/stream").status_code == 404
+
+    job = add_finished_job()
+    job.finished_at = time.time() - server.JOB_TTL - 1
+    assert client.get(f"/api/v1/jobs/{job.id}/stream").status_code == 404
+    assert job.id not in server.jobs
+
+
+def test_job_buffer_is_capped_and_keeps_newest_event(monkeypatch):
+    monkeypatch.setattr(server, "MAX_JOB_BUFFER_BYTES", 200)
+    job = server.Job()
+    for i in range(20):
+        job.publish({"event": "token", "text": "x" * 20})
+    job.publish({"event": "result", "response": "done"})
+    job.publish({"event": "done"})
+
+    async def collect():
+        return "".join([message async for message in job.stream(0)])
+
+    body = asyncio.run(collect())
+    ids = event_ids(body)
+    assert ids[0] > 0
+    assert ids[-2:] == [20, 21]
+    assert len(body) <= 200
+
+    # An event larger than the cap on its own is still kept when it is the newest
+    job = server.Job()
+    job.publish({"event": "token", "text": "x"})
+    job.publish({"event": "result", "response": "y" * 500})
+    assert [event_id for event_id, message in job._events] == [1]
+
+
+def test_streamed_result_is_truncated_and_full_file_downloadable(monkeypatch):
+    csv_data = "name\n" + "row\n" * 1000
+
+    def fake_process_points(self, file_path, output_name, init_crs):
+        return {"response": csv_data, "filename": output_name}
+
+    monkeypatch.setattr(GeoFileConverter, "process_points", fake_process_points)
+    client = TestClient(server.app)
+
+    with client.stream("POST", "/api/v1/process/stream", data=approve_form("out.csv")) as response:
+        body = response.read().decode()
+    result = [data for event, data in parse_sse(body) if event == "result"][0]
+    assert result["truncated"] is True
+    assert len(result["file"]) == server.RESULT_FILE_CHARS
+
+    download = client.get(result["result_url"])
+    assert download.status_code == 200
+    assert download.text == csv_data
+
+
+def test_queued_jobs_report_status_and_full_queue_is_rejected(monkeypatch):
+    monkeypatch.setattr(GeoFileConverter, "process_points",
+                        lambda self, file_path, output_name, init_crs: {"response": "", "filename": output_name})
+    client = TestClient(server.app)
+
+    monkeypatch.setattr(server, "active_jobs", server.MAX_CONCURRENT_JOBS)
+    with client.stream("POST", "/api/v1/process/stream", data=approve_form("q.csv")) as response:
+        events = parse_sse(response.read().decode())
+    statuses = [data for event, data in events if event == "status"]
+    assert statuses == [{"state": "queued", "position": 1}, {"state": "started"}]
+
+    monkeypatch.setattr(server, "active_jobs", server.MAX_CONCURRENT_JOBS + server.MAX_QUEUED_JOBS)
+    response = client.post("/api/v1/process/stream", data=approve_form("q.csv"))
+    assert response.status_code == 503
+
+
+def test_json_and_streaming_endpoints_return_the_same_plan(monkeypatch):
+    plan_json = json.dumps({
+        "explanation": "Convert points",
+        "function_calls": [{"function": {"name": "process_points",
+                                         "arguments": {"file_path": "a.csv", "output_name": "b.csv", "init_crs": "4326"}}}]
+    })
+
+    def create(**kwargs):
+        if kwargs.get("stream"):
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=plan_json))])])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=plan_json))])
+
+    monkeypatch.setattr(server.agent, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    client = TestClient(server.app)
+
+    plain = client.post("/api/v1/process", data={"prompt": "convert a.csv"}).json()
+    with client.stream("POST", "/api/v1/process/stream", data={"prompt": "convert a.csv"}) as response:
+        streamed = [data for event, data in parse_sse(response.read().decode()) if event == "plan"][0]
+
+    assert plain == streamed
+    assert plain["requires_approval"] is True
+    assert plain["plan"]["function_calls"][0]["function"]["name"] == "process_points"
\ No newline at end of file